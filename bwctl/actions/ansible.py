@@ -1,16 +1,23 @@
 import json
 import os
-import re
 import sys
 
 import sh
-from bwctl.utils.common import log_info, log_error
+from bwctl.utils.common import log_cmd_error, log_info, log_error
 from bwctl.utils.states import ObjectKind
 
+try:
+    import orjson
+except ImportError:  # optional C encoder, fall back to json module
+    orjson = None
+
 
 class Ansible:
     """Manipulate ansible provisioning"""
 
+    # Ansible output lines to be shown when not in debug mode
+    OUTPUT_PREFIXES = ('PLAY', 'TASK', 'RUNNING')
+
     def __init__(self, state=None, fabric=None, ansible_ssh_private_key_file=None):
         """Initialise all attributes"""
 
@@ -34,13 +41,38 @@ class Ansible:
             self.customer_company_name = self.state['fabric'][fabric]['config']['companyName']
         else:
             self.customer_company_name = ""
+        # Host variables shared by every inventory host
+        self.hostvars_base = {
+            'ansible_user': self.ansible_user,
+            'ansible_ssh_private_key_file': self.ansible_ssh_private_key_file,
+            'env_fabric_name': self.fabric,
+            'env_customer_company_name': self.customer_company_name,
+            'env_hosted_zone': self.hosted_zone
+        }
+        # Environment for ansible-playbook runs
+        self.playbook_env = dict(os.environ)
+        self.playbook_env['ANSIBLE_HOST_KEY_CHECKING'] = 'False'
+        self.playbook_env['ANSIBLE_RETRY_FILES_ENABLED'] = 'False'
+        self.playbook_env['ANSIBLE_SSH_RETRIES'] = '5'
+        # Reduce SSH round-trips per task (can be overridden from environment)
+        self.playbook_env.setdefault('ANSIBLE_PIPELINING', 'True')
+        self.playbook_env.setdefault('ANSIBLE_SSH_ARGS', '-C -o ControlMaster=auto -o ControlPersist=60s')
+        mitogen_strategy_dir = self.get_mitogen_strategy_dir()
+        if mitogen_strategy_dir is not None:
+            self.playbook_env.setdefault('ANSIBLE_STRATEGY_PLUGINS', mitogen_strategy_dir)
+            self.playbook_env.setdefault('ANSIBLE_STRATEGY', 'mitogen_linear')
 
         # Ensure ansible output directory exists
+        os.makedirs(self.ansible_dir, exist_ok=True)
+
+    @staticmethod
+    def get_mitogen_strategy_dir():
+        """Return mitogen strategy plugins directory if mitogen is installed, None otherwise"""
         try:
-            os.makedirs(self.ansible_dir)
-        except FileExistsError:
-            # directory already exists
-            pass
+            import ansible_mitogen
+        except ImportError:
+            return None
+        return os.path.join(os.path.dirname(ansible_mitogen.__file__), 'plugins', 'strategy')
 
     def add_inventory_group(self, groupname):
         """"Add host group to inventory"""
@@ -56,25 +88,20 @@ class Ansible:
         """Add host"""
         if variables is None:
             variables = []
-        self.inventory['_meta']['hostvars'][hostname] = {
-            'ansible_host': ip_addr,
-            'ansible_user': self.ansible_user,
-            'ansible_ssh_private_key_file': self.ansible_ssh_private_key_file,
-            'fqdn': fqdn,
-            'vm_region': vpc_region,
-            'env_fabric_name': self.fabric,
-            'env_customer_company_name': self.customer_company_name,
-            'env_hosted_zone': self.hosted_zone
-        }
+        hostvars = dict(self.hostvars_base)
+        hostvars['ansible_host'] = ip_addr
+        hostvars['fqdn'] = fqdn
+        hostvars['vm_region'] = vpc_region
         for var in variables:
-            self.inventory['_meta']['hostvars'][hostname][var[0]] = var[1]
+            hostvars[var[0]] = var[1]
             if var[0] == 'ssh_proxy_host':
                 ansible_ssh_controlpath = os.path.join(self.ansible_ssh_controlpath_dir,
                                                        'bwctl-ansible-ssh-%r@%h:%p-{}'.format(var[1]['ip']))
-                self.inventory['_meta']['hostvars'][hostname]['ansible_ssh_common_args'] = \
+                hostvars['ansible_ssh_common_args'] = \
                     '-o ProxyCommand="ssh -W %h:%p -q {}@{} -i {}" -o ControlPath="{}"'.format(
                         self.ansible_user, var[1]['ip'], self.ansible_ssh_private_key_file, ansible_ssh_controlpath
                     )
+        self.inventory['_meta']['hostvars'][hostname] = hostvars
         return True
 
     def add_group_host(self, hostname, groupname):
@@ -87,9 +114,12 @@ class Ansible:
         """Dump ansible inventory to a file"""
         # noinspection PyBroadException
         try:
-            with open(filename, 'w') as dump_f:
-                json.dump(attr, dump_f)
-            dump_f.close()
+            if orjson is not None:
+                payload = orjson.dumps(attr)
+            else:
+                payload = json.dumps(attr, separators=(',', ':')).encode('utf-8')
+            with open(filename, 'wb') as dump_f:
+                dump_f.write(payload)
         except IOError as dump_err:
             log_error("{0} - I/O error({1}): {2}".format(filename, dump_err.errno, dump_err.strerror))
             return False
@@ -110,25 +140,31 @@ class Ansible:
         if per_node_vars is None:
             per_node_vars = {}
         log_info("Generate ansible inventory...")
+        # Index nodes by name once: node -> (kind, node object, VPC object)
+        node_index = {}
+        for kind in [ObjectKind.ORCHESTRATOR.value, ObjectKind.PROCESSOR.value, ObjectKind.WORKLOAD.value]:
+            for node_name, node_obj in state_fabric[kind].items():
+                node_index[node_name] = (kind, node_obj)
         self.add_inventory_group('all')
         for node in node_list:
             inventory_node_vars = node_vars[:]
             if node in per_node_vars:
                 inventory_node_vars += per_node_vars[node]
-            node_kind = ObjectKind.WORKLOAD.value
-            node_fqdn = ''
-            for kind in [ObjectKind.ORCHESTRATOR.value, ObjectKind.PROCESSOR.value, ObjectKind.WORKLOAD.value]:
-                if node in state_fabric[kind]:
-                    node_kind = kind
-                    node_fqdn = state_fabric[node_kind][node]['properties']['fqdn']
-            self.add_inventory_host(node, state_fabric[node_kind][node]['properties']['ip'], node_fqdn,
-                                    state_fabric['vpc'][state_fabric[node_kind][node]['vpc']]['region'],
+            if node in node_index:
+                node_kind, node_obj = node_index[node]
+                node_fqdn = node_obj['properties']['fqdn']
+            else:
+                node_kind = ObjectKind.WORKLOAD.value
+                node_obj = state_fabric[node_kind][node]
+                node_fqdn = ''
+            node_vpc = state_fabric['vpc'][node_obj['vpc']]
+            self.add_inventory_host(node, node_obj['properties']['ip'], node_fqdn, node_vpc['region'],
                                     inventory_node_vars)
             self.add_group_host(node, 'all')
             self.add_inventory_group(node_kind)
             self.add_group_host(node, node_kind)
             for node_cloud in ['aws', 'gcp', 'azr']:
-                if node_cloud in state_fabric['vpc'][state_fabric[node_kind][node]['vpc']]['cloud']:
+                if node_cloud in node_vpc['cloud']:
                     self.add_inventory_group(node_cloud)
                     self.add_group_host(node, node_cloud)
         for node in state_fabric['orchestrator']:
@@ -145,11 +181,12 @@ class Ansible:
     def ansible_process_output(self, line):
         """Filter ansible output"""
         if not self.debug:
-            if re.match("PLAY|TASK|RUNNING", line):
+            if line.startswith(self.OUTPUT_PREFIXES):
                 log_info(line.strip().strip('* '))
         else:
-            if bool(line.strip()):
-                log_info(line.strip().strip('* '))
+            line = line.strip()
+            if line:
+                log_info(line.strip('* '))
 
     def run_playbook(self, playbook_file_name, tag_list=None, local=None):
         """Run ansible playbook"""
@@ -157,12 +194,6 @@ class Ansible:
             tag_list = []
         log_info("Running ansible playbook {0!r}...".format(playbook_file_name))
 
-        # Prepare env
-        cwd = os.getcwd()
-        os.chdir(self.ansible_dir)
-        os.environ['ANSIBLE_HOST_KEY_CHECKING'] = 'False'
-        os.environ['ANSIBLE_RETRY_FILES_ENABLED'] = 'False'
-        os.environ['ANSIBLE_SSH_RETRIES'] = '5'
         ansible_parameters = ["-i", "localhost,", "-c", "local", "-u", os.getenv('USER', ''),
                               "--extra-vars", "env_fabric_name=" + self.fabric,
                               "--extra-vars", "env_customer_company_name=" + self.customer_company_name,
@@ -173,25 +204,16 @@ class Ansible:
             ansible_parameters = ["-i", "ansible_inventory.sh", playbook_file_name]
         # Add tags if provided
         if tag_list:
-            tags = ""
-            ansible_parameters.append("--tags")
-            for tag in tag_list:
-                tags += tag + ","
-            ansible_parameters.append(tags)
+            ansible_parameters += ["--tags", ",".join(tag_list)]
         # Run ansible playbook
         try:
-            cmd = sh.ansible_playbook(ansible_parameters, _out=self.ansible_process_output, _bg=True)
+            cmd = sh.ansible_playbook(ansible_parameters, _out=self.ansible_process_output, _bg=True,
+                                      _cwd=self.ansible_dir, _env=self.playbook_env)
             cmd.wait()
         except sh.ErrorReturnCode as err:
-            log_info(err.full_cmd)
-            log_info('Command output:' + err.stdout.decode('UTF-8').rstrip())
-            log_error(err.stderr.decode('UTF-8').rstrip(), nl=False)
+            log_cmd_error(err)
             log_error("Unexpected ansible playbook error (status code {0!r})".format(err.exit_code))
-            if os.path.exists(cwd):
-                os.chdir(cwd)
             return False, err.exit_code
-        if os.path.exists(cwd):
-            os.chdir(cwd)
         return True, 0
 
 
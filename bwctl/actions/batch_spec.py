@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from bwctl.utils.common import log_info
 from bwctl.utils.states import ObjectKind
 
@@ -17,25 +19,26 @@ class BatchSpec(object):
         self.batch_api_version = self.batch.get('apiVersion')
         self.batch_metadata = self.batch.get('metadata')
         self.batch_spec = self.batch.get('spec')
-        self.spec = dict()
+        self.spec = defaultdict(list)
+        self.spec_by_name = defaultdict(dict)
         for i in self.batch_spec:
-            if i['kind'].lower() in self.spec:
-                self.spec[i['kind'].lower()].append(i)
-            else:
-                self.spec[i['kind'].lower()] = [i]
+            self.add_spec_item(i['kind'].lower(), i)
         log_info(
             "Found batch {0!r} ({1!s}) with {2!s} objects".format(self.batch_metadata['name'],
                                                                   self.batch_metadata['description'],
                                                                   len(self.batch_spec)))
         # TODO: Handle wrong format
 
+    def add_spec_item(self, kind, value):
+        """Add batch value to the list and name index of given kind"""
+        self.spec[kind].append(value)
+        # First object with the name wins, as it would for a lookup over the list
+        self.spec_by_name[kind].setdefault(self.get_attr_name(value), value)
+
     def add_to_attr_list(self, attr, value):
         """Add batch value to attribute list"""
-        if attr is not None and type(attr) == ObjectKind:
-            if attr.value in self.spec:
-                self.spec[attr.value].append(value)
-            else:
-                self.spec[attr.value] = [value]
+        if isinstance(attr, ObjectKind):
+            self.add_spec_item(attr.value, value)
 
     def check_batch_version(self):
         """Check batch API version and bwctl API version"""
@@ -46,8 +49,14 @@ class BatchSpec(object):
 
     def get_attr_list(self, attr):
         """Get batch attribute list"""
-        if attr is not None and type(attr) == ObjectKind:
-            return [elem for key, value in self.spec.items() if key == attr.value for elem in value]
+        if isinstance(attr, ObjectKind):
+            return self.spec.get(attr.value, [])
+        return None
+
+    def get_by_name(self, attr, name):
+        """Get batch object of attribute kind by name"""
+        if isinstance(attr, ObjectKind):
+            return self.spec_by_name[attr.value].get(name)
         return None
 
     @staticmethod
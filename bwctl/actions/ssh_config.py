@@ -16,6 +16,12 @@ class SshConfig:
         self.username = state.config.get_attr('username')
 
     def generate_config(self):
-        """Generate ssh config file from template and dump it to file"""
+        """Generate ssh config file from template and dump it to file, unless file content is the same"""
         ssh_config_out = generate_ssh_config_from_template(self.state, self.hosted_zone, self.username)
+        try:
+            with open(self.out_file, 'r') as ssh_config_f:
+                if ssh_config_f.read() == ssh_config_out:
+                    return True
+        except (OSError, UnicodeDecodeError):
+            pass
         return dump_to_file(self.out_file, ssh_config_out)
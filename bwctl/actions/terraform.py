@@ -1,15 +1,22 @@
+import fcntl
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 
 import click
 import sh
-from bwctl.utils.common import check_process_running, log_info, log_error, log_warn
+from bwctl.utils.common import log_cmd_error, log_info, log_error, log_warn
 from bwctl.utils.templates import generate_from_template
 
 
 class Terraform:
     """Manipulate terraform from templates"""
 
+    # Rendered templates by name, as (inputs digest, content), shared across runs in one session
+    rendered_templates = {}
+
     def __init__(self, fabric=None, state=None, credentials=None, bwctl_version=None):
         """Initialise all attributes"""
         self.TERRAFORM_TEMPLATES = [
@@ -57,39 +64,107 @@ class Terraform:
         else:
             self.production = "false"
         self.hosted_zone = self.config.get_attr('hosted_zone')
+        # Terraform output variables by module
+        self.outputs = {}
 
         # Ensure terraform output directory exists
-        try:
-            os.makedirs(self.terraform_dir)
-        except FileExistsError:
-            # directory already exists
-            pass
-
-        # Initialise cloud provider credentials
-        get_param = credentials.get_aws_param('aws_ec2_role')
-        self.aws_ec2_role = get_param.value if get_param.status else False
-        get_param = credentials.get_aws_param('aws_secret_access_key')
-        self.aws_secret_key = get_param.value if get_param.status else ""
-        get_param = credentials.get_aws_param('aws_access_key_id')
-        self.aws_access_key_id = get_param.value if get_param.status else ""
-        get_param = credentials.get_gcp_param('google_cloud_keyfile_json')
-        self.gcp_credentials = get_param.value if get_param.status else ""
-        get_param = credentials.get_gcp_param('project_id')
-        self.gcp_project_name = get_param.value if get_param.status else ""
-        get_param = credentials.get_azr_param('azr_client_id')
-        self.azr_client_id = get_param.value if get_param.status else ""
-        get_param = credentials.get_azr_param('azr_client_secret')
-        self.azr_client_secret = get_param.value if get_param.status else ""
-        get_param = credentials.get_azr_param('azr_resource_group_name')
-        self.azr_resource_group_name = get_param.value if get_param.status else ""
-        get_param = credentials.get_azr_param('azr_subscription_id')
-        self.azr_subscription_id = get_param.value if get_param.status else ""
-        get_param = credentials.get_azr_param('azr_tennant_id')
-        self.azr_tennant_id = get_param.value if get_param.status else ""
-        get_param = credentials.get_aws_param('aws_secret_access_key')
-        self.s3_secret_key = get_param.value if get_param.status else ""
-        get_param = credentials.get_aws_param('aws_access_key_id')
-        self.s3_access_key_id = get_param.value if get_param.status else ""
+        os.makedirs(self.terraform_dir, exist_ok=True)
+
+        # Cloud provider credentials are resolved on first use
+        self.credentials = credentials
+        self.credentials_params = {}
+        # Variables passed to every terraform refresh/apply
+        self.common_vars = None
+
+    def get_credentials_param(self, cloud_name, param_name, default=""):
+        """Get cloud provider credentials parameter (cached)"""
+        if (cloud_name, param_name) not in self.credentials_params:
+            get_param = self.credentials.get_cloud_param(cloud_name, param_name)
+            self.credentials_params[(cloud_name, param_name)] = get_param.value if get_param.status else default
+        return self.credentials_params[(cloud_name, param_name)]
+
+    @property
+    def aws_ec2_role(self):
+        """AWS EC2 role usage flag"""
+        return self.get_credentials_param('aws', 'aws_ec2_role', False)
+
+    @property
+    def aws_secret_key(self):
+        """AWS secret access key"""
+        return self.get_credentials_param('aws', 'aws_secret_access_key')
+
+    @property
+    def aws_access_key_id(self):
+        """AWS access key ID"""
+        return self.get_credentials_param('aws', 'aws_access_key_id')
+
+    @property
+    def gcp_credentials(self):
+        """GCP credentials file"""
+        return self.get_credentials_param('gcp', 'google_cloud_keyfile_json')
+
+    @property
+    def gcp_project_name(self):
+        """GCP project name"""
+        return self.get_credentials_param('gcp', 'project_id')
+
+    @property
+    def azr_client_id(self):
+        """Azure client ID"""
+        return self.get_credentials_param('azr', 'azr_client_id')
+
+    @property
+    def azr_client_secret(self):
+        """Azure client secret"""
+        return self.get_credentials_param('azr', 'azr_client_secret')
+
+    @property
+    def azr_resource_group_name(self):
+        """Azure resource group name"""
+        return self.get_credentials_param('azr', 'azr_resource_group_name')
+
+    @property
+    def azr_subscription_id(self):
+        """Azure subscription ID"""
+        return self.get_credentials_param('azr', 'azr_subscription_id')
+
+    @property
+    def azr_tennant_id(self):
+        """Azure tennant ID"""
+        return self.get_credentials_param('azr', 'azr_tennant_id')
+
+    @property
+    def s3_secret_key(self):
+        """S3 backend secret access key (same as AWS one)"""
+        return self.aws_secret_key
+
+    @property
+    def s3_access_key_id(self):
+        """S3 backend access key ID (same as AWS one)"""
+        return self.aws_access_key_id
+
+    def get_common_vars(self):
+        """Get variables passed to every terraform refresh/apply (cached)"""
+        if self.common_vars is None:
+            self.common_vars = [
+                "-var", "gcp_credentials=" + self.gcp_credentials,
+                "-var", "gcp_project_name=" + self.gcp_project_name,
+                "-var", "azr_client_id=" + self.azr_client_id,
+                "-var", "azr_client_secret=" + self.azr_client_secret,
+                "-var", "azr_resource_group_name=" + self.azr_resource_group_name,
+                "-var", "azr_subscription_id=" + self.azr_subscription_id,
+                "-var", "azr_tennant_id=" + self.azr_tennant_id,
+                "-var", "image_tag=" + self.image_tag,
+                "-var", "image_version=" + self.image_family.replace(".", "-"),
+                "-var", "dns_managed_zone_domain=" + self.hosted_zone
+            ]
+            # Check if there AWS keys or EC2 role should be used
+            if not self.aws_ec2_role:
+                self.common_vars += [
+                    "-var", "aws_secret_key={}".format(self.s3_secret_key),
+                    "-var", "aws_access_key={}".format(self.s3_access_key_id)
+                ]
+        return self.common_vars
 
     @staticmethod
     def terraform_process_output(line):
@@ -97,69 +172,54 @@ class Terraform:
         if bool(line.strip()):
             log_info(line.strip())
 
-    def get_output_variable(self, module, variable):
+    def get_module_outputs(self, module, refresh=False):
+        """Get all output variables of module from terraform plan (cached)"""
+        if refresh or module not in self.outputs:
+            try:
+                cmd = sh.terraform("output", "-json", "-module=" + module, _cwd=self.terraform_dir)
+            except sh.ErrorReturnCode as err:
+                log_cmd_error(err)
+                log_error("Unexpected terraform error during output (status code {0!r})".format(err.exit_code))
+                return {}
+            try:
+                self.outputs[module] = json.loads(str(cmd)) or {}
+            except ValueError:
+                log_error("Unexpected terraform output format for module {0!r}".format(module))
+                return {}
+        return self.outputs[module]
+
+    def get_output_variable(self, module, variable, refresh=False):
         """Get output variable from terraform plan"""
-        cwd = os.getcwd()
-        os.chdir(self.terraform_dir)
-        try:
-            cmd = sh.terraform("output", "-module=" + module, variable)
-        except sh.ErrorReturnCode as err:
-            log_info(err.full_cmd)
-            log_info('Command output:' + err.stdout.decode('UTF-8').rstrip())
-            log_error(err.stderr.decode('UTF-8').rstrip(), nl=False)
-            log_error("Unexpected terraform error during output (status code {0!r})".format(err.exit_code))
-            os.chdir(cwd)
-            return None
-        os.chdir(cwd)
-        if not bool(cmd.strip()):
+        output = self.get_module_outputs(module, refresh).get(variable) or {}
+        value = str(output.get('value') or '').strip()
+        if not bool(value):
             return None
         else:
-            return cmd.strip()
+            return value
 
     def get_output_variable_with_retries(self, module, variable, retries):
         """Get output variable from terraform plan (with retries)"""
-        terraform_refresh = [
-            "refresh", "-input=false",
-            "-var", "gcp_credentials=" + self.gcp_credentials,
-            "-var", "gcp_project_name=" + self.gcp_project_name,
-            "-var", "azr_client_id=" + self.azr_client_id,
-            "-var", "azr_client_secret=" + self.azr_client_secret,
-            "-var", "azr_resource_group_name=" + self.azr_resource_group_name,
-            "-var", "azr_subscription_id=" + self.azr_subscription_id,
-            "-var", "azr_tennant_id=" + self.azr_tennant_id,
-            "-var", "image_tag=" + self.image_tag,
-            "-var", "image_version=" + self.image_family.replace(".", "-"),
-            "-var", "dns_managed_zone_domain=" + self.hosted_zone,
+        terraform_refresh = ["refresh", "-input=false"] + self.get_common_vars() + [
             "-target=module." + module + ".azurerm_virtual_machine.vm"
         ]
-        # Check if there AWS keys or EC2 role should be used
-        if not self.aws_ec2_role:
-            terraform_refresh.append("-var")
-            terraform_refresh.append("aws_secret_key={}".format(self.s3_secret_key))
-            terraform_refresh.append("-var")
-            terraform_refresh.append("aws_access_key={}".format(self.s3_access_key_id))
         log_info("Getting {0!r} output for {1!r} from terraform state...".format(variable, module))
         var = self.get_output_variable(module, variable)
         i = 1
-        cwd = os.getcwd()
-        os.chdir(self.terraform_dir)
         while var is None and i <= retries:
             log_warn('Retry to get {0!r} output from terraforn state. ({1} of {2})'.format(variable, i, retries))
             log_info('Refresh terraform module...')
             try:
                 if not self.config.get_debug():
-                    sh.terraform(terraform_refresh)
+                    sh.terraform(terraform_refresh, _cwd=self.terraform_dir)
                 else:
-                    cmd = sh.terraform(terraform_refresh, _out=self.terraform_process_output, _bg=True)
+                    cmd = sh.terraform(terraform_refresh, _out=self.terraform_process_output, _bg=True,
+                                       _cwd=self.terraform_dir)
                     cmd.wait()
             except sh.ErrorReturnCode as err:
-                log_info(err.full_cmd)
-                log_info('Command output:' + err.stdout.decode('UTF-8').rstrip())
-                log_error(err.stderr.decode('UTF-8').rstrip(), nl=False)
+                log_cmd_error(err)
                 log_error("Unexpected terraform error during refresh (status code {0!r})".format(err.exit_code))
-            var = self.get_output_variable(module, variable)
+            var = self.get_output_variable(module, variable, refresh=True)
             i = i + 1
-        os.chdir(cwd)
         return var
 
     @staticmethod
@@ -167,9 +227,8 @@ class Terraform:
         """Dump terraform template to a file"""
         # noinspection PyBroadException
         try:
-            with open(filename, 'w') as dump_f:
-                dump_f.write(attr)
-            dump_f.close()
+            with open(filename, 'wb') as dump_f:
+                dump_f.write(attr.encode('utf-8'))
         except IOError as dump_err:
             log_error("{0} - I/O error({1}): {2}".format(filename, dump_err.errno, dump_err.strerror))
             return False
@@ -185,20 +244,40 @@ class Terraform:
         def show_item(item):
             """Print current item"""
             if item is not None:
-                return '-> {0!s}'.format(item)
-
-        with click.progressbar(self.TERRAFORM_TEMPLATES, item_show_func=show_item) as bar:
-            for template in bar:
-                dst_filename = os.path.join(self.terraform_dir, template)
-                if not self.plan_dump(
-                        generate_from_template(self.state, self.fabric, self.hosted_zone, self.pub_key,
-                                               self.config.get_attr('cloud_storage'),
-                                               self.config.get_attr('fabric_manager'), self.username, self.aws_ec2_role,
-                                               template + '.j2'),
-                        dst_filename):
-                    return False
+                return '-> {0!s}'.format(futures[item])
+
+        # Templates are independent from each other, so render them in parallel
+        cloud_storage = self.config.get_attr('cloud_storage')
+        fabric_manager = self.config.get_attr('fabric_manager')
+        inputs_key = self.get_plan_inputs_key(cloud_storage, fabric_manager)
+        with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 8)) as executor:
+            futures = {}
+            for template in self.TERRAFORM_TEMPLATES:
+                cached = self.rendered_templates.get(template)
+                if cached is not None and cached[0] == inputs_key:
+                    # Inputs unchanged since last render, reuse content
+                    future = Future()
+                    future.set_result(cached[1])
+                else:
+                    future = executor.submit(generate_from_template, self.state, self.fabric, self.hosted_zone,
+                                             self.pub_key, cloud_storage, fabric_manager, self.username,
+                                             self.aws_ec2_role, template + '.j2')
+                futures[future] = template
+            with click.progressbar(as_completed(futures), length=len(futures), item_show_func=show_item) as bar:
+                for future in bar:
+                    template = futures[future]
+                    content = future.result()
+                    self.rendered_templates[template] = (inputs_key, content)
+                    if not self.plan_dump(content, os.path.join(self.terraform_dir, template)):
+                        return False
         return True
 
+    def get_plan_inputs_key(self, cloud_storage, fabric_manager):
+        """Get digest of all inputs used for rendering terraform templates"""
+        inputs = [self.state, self.fabric, self.hosted_zone, self.pub_key, cloud_storage, fabric_manager,
+                  self.username, self.aws_ec2_role]
+        return hashlib.blake2b(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).digest()
+
     def plan_execute(self):
         """Execute terraform plan"""
         terraform_steps = {
@@ -206,20 +285,9 @@ class Terraform:
                 "init", "-input=false",
                 "-force-copy"
             ],
-            'apply': [
-                "apply", "-input=false",
-                "-var", "gcp_credentials=" + self.gcp_credentials,
-                "-var", "gcp_project_name=" + self.gcp_project_name,
-                "-var", "azr_client_id=" + self.azr_client_id,
-                "-var", "azr_client_secret=" + self.azr_client_secret,
-                "-var", "azr_resource_group_name=" + self.azr_resource_group_name,
-                "-var", "azr_subscription_id=" + self.azr_subscription_id,
-                "-var", "azr_tennant_id=" + self.azr_tennant_id,
+            'apply': ["apply", "-input=false"] + self.get_common_vars() + [
                 "-var", "production=" + self.production,
                 "-var", "bastion_ip=" + self.config.get_attr('fabric_manager')['ip'],
-                "-var", "image_tag=" + self.image_tag,
-                "-var", "image_version=" + self.image_family.replace(".", "-"),
-                "-var", "dns_managed_zone_domain=" + self.hosted_zone,
                 "-auto-approve"
             ]
         }
@@ -227,19 +295,16 @@ class Terraform:
         if not self.aws_ec2_role:
             terraform_steps['init'].append("-backend-config=secret_key={}".format(self.s3_secret_key))
             terraform_steps['init'].append("-backend-config=access_key={}".format(self.s3_access_key_id))
-            terraform_steps['apply'].append("-var")
-            terraform_steps['apply'].append("aws_secret_key={}".format(self.s3_secret_key))
-            terraform_steps['apply'].append("-var")
-            terraform_steps['apply'].append("aws_access_key={}".format(self.s3_access_key_id))
-        cwd = os.getcwd()
         log_info("Running terraform init and apply...")
-        os.chdir(self.terraform_dir)
-        # Check if there is any terraform already running
-        proc_name = 'terraform'
-        proc_result = check_process_running(proc_name)
-        if proc_result[0]:
-            log_error("There is already {!r} process (PID {!r}) running for user {!r}. Please retry again "
-                      "later...".format(proc_name, str(proc_result[1]), proc_result[2]))
+        # Make sure there is no other terraform run for this fabric
+        lock_path = os.path.join(self.terraform_dir, '.bwctl-tf.lock')
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            log_error("There is already terraform running for fabric {!r}. Please retry again "
+                      "later...".format(self.fabric))
             return False, 1
 
         def show_step(item):
@@ -253,34 +318,32 @@ class Terraform:
                 else:
                     return '-> {0}'.format(t_keys[idx + 1])
 
-        if not self.config.get_debug():
-            with click.progressbar(terraform_steps, item_show_func=show_step, show_eta=False) as bar:
-                for step in bar:
+        try:
+            if not self.config.get_debug():
+                with click.progressbar(terraform_steps, item_show_func=show_step, show_eta=False) as bar:
+                    for step in bar:
+                        try:
+                            sh.terraform(terraform_steps[step], _cwd=self.terraform_dir)
+                        except sh.ErrorReturnCode as err:
+                            log_cmd_error(err)
+                            log_error("Unexpected terraform error during {0!s} (status code {1!r})".format(
+                                step, err.exit_code))
+                            return False, err.exit_code
+            else:
+                for step in terraform_steps:
                     try:
-                        sh.terraform(terraform_steps[step])
+                        cmd = sh.terraform(terraform_steps[step], _out=self.terraform_process_output, _bg=True,
+                                           _cwd=self.terraform_dir)
+                        cmd.wait()
                     except sh.ErrorReturnCode as err:
-                        log_info(err.full_cmd)
-                        log_info('Command output:' + err.stdout.decode('UTF-8').rstrip())
-                        log_error(err.stderr.decode('UTF-8').rstrip(), nl=False)
+                        log_cmd_error(err)
                         log_error("Unexpected terraform error during {0!s} (status code {1!r})".format(step,
                                                                                                        err.exit_code))
-                        os.chdir(cwd)
                         return False, err.exit_code
-        else:
-            for step in terraform_steps:
-                try:
-                    cmd = sh.terraform(terraform_steps[step], _out=self.terraform_process_output, _bg=True)
-                    cmd.wait()
-                except sh.ErrorReturnCode as err:
-                    log_info(err.full_cmd)
-                    log_info('Command output:' + err.stdout.decode('UTF-8').rstrip())
-                    log_error(err.stderr.decode('UTF-8').rstrip(), nl=False)
-                    log_error("Unexpected terraform error during {0!s} (status code {1!r})".format(step,
-                                                                                                   err.exit_code))
-                    os.chdir(cwd)
-                    return False, err.exit_code
-
-        os.chdir(cwd)
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(lock_fd)
+
         return True, 0
 
 
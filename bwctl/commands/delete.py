@@ -1,5 +1,7 @@
 """bwctl: 'delete' commands implementation"""
+import os
 import sys
+from collections import defaultdict
 from copy import deepcopy
 
 import click
@@ -10,10 +12,34 @@ from bwctl.actions.batch_spec import BatchSpec
 from bwctl.actions.ssh_config import SshConfig
 from bwctl.actions.terraform import Terraform
 from bwctl.session.credentials import Credentials
+from bwctl.session.state import CowState
+from bwctl.utils import yaml_compat
 from bwctl.utils.click import AliasedGroup
 from bwctl.utils.common import log_info, log_error, log_ok, log_warn
 from bwctl.utils.states import ObjectStatus, ObjectState, ObjectKind
 
+# Batch object kinds to be deleted, in order of listing
+DELETE_OBJECT_KINDS = (ObjectKind.FABRIC, ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR,
+                       ObjectKind.WORKLOAD)
+# Object kinds deleted together with their fabric
+NESTED_OBJECT_KINDS = (ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD)
+# Node kinds deleted together with their VPC
+NODE_OBJECT_KINDS = (ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD)
+
+# Accepted answers to yes/no confirmation
+CONFIRM_ANSWERS = {"yes": True, "y": True, "ye": True, "no": False, "n": False}
+
+
+def confirm_yes_no(message, default="no"):
+    """Requires confirmation with yes/no"""
+    prompt = message + " [y/N] "
+    while True:
+        log_info(prompt)
+        answer = CONFIRM_ANSWERS.get(input().lower() or default)
+        if answer is not None:
+            return answer
+        log_info("Please respond with 'yes' or 'no'")
+
 
 @click.group('delete', cls=AliasedGroup)
 def delete_cmd():
@@ -36,16 +62,16 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
     # Safely load YAML
     # noinspection PyBroadException
     try:
-        with open(filename, 'r') as config_f:
+        with open(filename, 'rb') as config_f:
             try:
-                batch = yaml.safe_load(config_f)
+                # Batch deleted is usually the one created before, so its parsed content is reused from cache
+                batch = yaml_compat.safe_load_cached(config_f.read(), os.path.join(ctx.obj.state.config.dir, 'cache'))
             except yaml.YAMLError as err:
                 log_error("Error while loading YAML: {0!r}".format(err))
                 if hasattr(err, 'problem_mark'):
                     mark = err.problem_mark
                     log_error("Error position: ({}:{})".format(mark.line + 1, mark.column + 1))
                 sys.exit(1)
-        config_f.close()
     except IOError as err:
         log_error(err)
         sys.exit(1)
@@ -61,69 +87,78 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
         sys.exit(1)
 
     # Get objects to be deleted (by fabric)
-    delete_target = {}
-    for obj_kind in [ObjectKind.FABRIC, ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR,
-                     ObjectKind.WORKLOAD]:
+    delete_target = defaultdict(lambda: {obj_kind: [] for obj_kind in DELETE_OBJECT_KINDS})
+    for obj_kind in DELETE_OBJECT_KINDS:
+        name_attr = 'name' if obj_kind == ObjectKind.FABRIC else 'fabric'
         for obj in batch.get_attr_list(obj_kind):
-            if obj_kind == ObjectKind.FABRIC:
-                fabric_name = obj['metadata']['name']
-            else:
-                fabric_name = obj['metadata']['fabric']
-            if fabric_name not in delete_target:
-                delete_target[fabric_name] = {ObjectKind.FABRIC: [], ObjectKind.VPC: [], ObjectKind.WORKLOAD: [],
-                                              ObjectKind.ORCHESTRATOR: [], ObjectKind.PROCESSOR: []}
-            delete_target[fabric_name][obj_kind].append(batch.get_attr_name(obj))
+            delete_target[obj['metadata'][name_attr]][obj_kind].append(batch.get_attr_name(obj))
 
     for fabric in delete_target:
-        for obj_kind in [ObjectKind.FABRIC, ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR,
-                         ObjectKind.WORKLOAD]:
+        for obj_kind in DELETE_OBJECT_KINDS:
             if obj_kind in delete_target[fabric]:
                 if delete_target[fabric][obj_kind]:
                     log_info('{0}: {1!r}'.format(obj_kind.value.title(), delete_target[fabric][obj_kind]))
 
-    def confirm_yes_no(message, default="no"):
-        """Requires confirmation with yes/no"""
-        valid = {"yes": True, "y": True, "ye": True, "no": False, "n": False}
-        prompt = " [y/N] "
-        while True:
-            log_info(message + prompt)
-            choice = input().lower()
-            if choice == '':
-                return valid[default]
-            elif choice in valid:
-                return valid[choice]
-            else:
-                log_info("Please respond with 'yes' or 'no'")
-
     if not yes:
         if not confirm_yes_no('Do you want to delete these objects?'):
             log_info('Exiting...')
             return True
 
+    # Credentials are fetched once per fabric, clouds in use can only be removed by the batch
+    credentials_cache = {}
+
+    def get_credentials(fabric_name, state):
+        """Returns credentials for fabric, exits if not able to get them"""
+        if fabric_name not in credentials_cache:
+            fabric_credentials = Credentials(fabric_name, state.get(), ctx.obj.state.config)
+            if not fabric_credentials.get():
+                log_error('Batch failed. Not able to get credentials')
+                sys.exit(1)
+            credentials_cache[fabric_name] = fabric_credentials
+        return credentials_cache[fabric_name]
+
+    def get_working_states(fabric_name, has_targets):
+        """Returns ok and failed working states, session state itself is used if there is nothing to delete"""
+        if not has_targets:
+            return ctx.obj.state, ctx.obj.state
+        return CowState(ctx.obj.state, fabric_name), CowState(ctx.obj.state, fabric_name)
+
+    def run_terraform(fabric_name, state_ok, state_failed, error_msg):
+        """Applies terraform plan for state_ok, on failure dumps state_failed and exits"""
+        terraform = Terraform(fabric_name, state_ok, get_credentials(fabric_name, state_failed), ctx.obj.version)
+        if not terraform.plan_generate():
+            log_error(error_msg)
+            ctx.obj.state = state_failed
+            ctx.obj.state.dump()
+            sys.exit(1)
+        terraform_result = terraform.plan_execute()
+        if not terraform_result[0]:
+            log_error(error_msg)
+            ctx.obj.state = state_failed
+            ctx.obj.state.dump()
+            sys.exit(terraform_result[1])
+
     # For all fabrics in delete target
     for fabric in delete_target:
-        # Processing fabrics
-        if fabric in delete_target[fabric][ObjectKind.FABRIC]:
-            temp_state_ok = deepcopy(ctx.obj.state)
-            temp_state_failed = deepcopy(ctx.obj.state)
-            if temp_state_failed.check_fabric(fabric):
+        # Processing fabrics, fabric objects are grouped under their own name, so any entry is this fabric
+        if delete_target[fabric][ObjectKind.FABRIC]:
+            if ctx.obj.state.check_fabric(fabric):
+                temp_state_ok = CowState(ctx.obj.state, fabric)
+                temp_state_failed = CowState(ctx.obj.state, fabric)
                 log_warn('Fabric {0!r} is going to be deleted with all nested objects'.format(fabric))
                 # Set deleting status in state
                 temp_state_failed.set_object_state_status(temp_state_failed.get_fabric(fabric), ObjectState.DELETING,
                                                           ObjectStatus.FAILED)
-                # Get nested objects
+                # Get nested objects and set their state to deleting
                 nested = []
-                for obj_kind in [ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD]:
-                    nested.append([obj[0] for obj in
-                                   temp_state_failed.get_fabric_objects(obj_kind.value, fabric).items()])
-                # Set nested state to deleting
-                for index, obj_kind in enumerate([ObjectKind.VPC, ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR,
-                                                  ObjectKind.WORKLOAD]):
-                    for obj_name in nested[index]:
-                        obj = temp_state_failed.get_fabric_object(obj_kind.value, obj_name, fabric)
+                for obj_kind in NESTED_OBJECT_KINDS:
+                    kind_value = obj_kind.value
+                    kind_objects = temp_state_failed.get_fabric_objects(kind_value, fabric)
+                    nested.append(list(kind_objects))
+                    for obj_name, obj in kind_objects.items():
                         temp_state_failed.set_object_state_status(obj, ObjectState.DELETING, ObjectStatus.FAILED)
                         if obj_kind != ObjectKind.VPC:
-                            res = temp_state_ok.delete_fabric_object(obj_kind.value, obj_name, fabric)
+                            res = temp_state_ok.delete_fabric_object(kind_value, obj_name, fabric)
                             if not res.status:
                                 log_error('Fabric {0!r} cannot be deleted. {1!s}'.format(fabric, res.value))
                                 sys.exit(1)
@@ -132,24 +167,9 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                 nested_nodes = nested[1] + nested[2] + nested[3]
                 if nested_nodes:
                     log_info("Deleting nested nodes first")
-                    # Get credentials
-                    credentials = Credentials(fabric, temp_state_failed.get(), ctx.obj.state.config)
-                    if not credentials.get():
-                        log_error('Batch failed. Not able to get credentials')
-                        sys.exit(1)
                     # Run terraform
-                    terraform = Terraform(fabric, temp_state_ok, credentials, ctx.obj.version)
-                    if not terraform.plan_generate():
-                        log_error('Batch failed to delete nested nodes: {!r}. Exiting'.format(nested_nodes))
-                        ctx.obj.state = deepcopy(temp_state_failed)
-                        ctx.obj.state.dump()
-                        sys.exit(1)
-                    terraform_result = terraform.plan_execute()
-                    if not terraform_result[0]:
-                        log_error('Batch failed to delete nested nodes: {!r}. Exiting'.format(nested_nodes))
-                        ctx.obj.state = deepcopy(temp_state_failed)
-                        ctx.obj.state.dump()
-                        sys.exit(terraform_result[1])
+                    run_terraform(fabric, temp_state_ok, temp_state_failed,
+                                  'Batch failed to delete nested nodes: {!r}. Exiting'.format(nested_nodes))
                 # If this is current fabric, unset it
                 if temp_state_failed.get_current_fabric() == fabric:
                     ctx.obj.set_current_fabric(None)
@@ -161,24 +181,9 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                 # Try to delete nested VPCs
                 if nested[0]:
                     log_info("Deleting nested VPCs")
-                    # Get credentials
-                    credentials = Credentials(fabric, temp_state_failed.get(), ctx.obj.state.config)
-                    if not credentials.get():
-                        log_error('Batch failed. Not able to get credentials')
-                        sys.exit(1)
                     # Run terraform
-                    terraform = Terraform(fabric, temp_state_ok, credentials, ctx.obj.version)
-                    if not terraform.plan_generate():
-                        log_error('Batch failed to delete fabric: {!r}. Exiting'.format(fabric))
-                        ctx.obj.state = deepcopy(temp_state_failed)
-                        ctx.obj.state.dump()
-                        sys.exit(1)
-                    terraform_result = terraform.plan_execute()
-                    if not terraform_result[0]:
-                        log_error('Batch failed to delete fabric: {!r}. Exiting'.format(fabric))
-                        ctx.obj.state = deepcopy(temp_state_failed)
-                        ctx.obj.state.dump()
-                        sys.exit(terraform_result[1])
+                    run_terraform(fabric, temp_state_ok, temp_state_failed,
+                                  'Batch failed to delete fabric: {!r}. Exiting'.format(fabric))
                 # Run ansible playbook
                 ansible_playbook = "delete-fabric.yml"
                 ansible = Ansible(temp_state_failed, fabric, temp_state_failed.get_ssh_key())
@@ -186,18 +191,24 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                 ansible_result = ansible.run_playbook(ansible_playbook, local=True)
                 if not ansible_result[0]:
                     log_error('Cannot delete fabric. There is issue with ansible playbook execution')
-                    ctx.obj.state = deepcopy(temp_state_failed)
+                    ctx.obj.state = temp_state_failed
                     ctx.obj.dump()
                     sys.exit(ansible_result[1])
                 # Delete fabrics batches
                 temp_state_ok.nodebatch_delete(fabric=fabric)
                 # Success
-                ctx.obj.state = deepcopy(temp_state_ok)
+                ctx.obj.state = temp_state_ok
                 ctx.obj.state.dump()
         # Processing VPCs
         nested = {}
-        temp_state_ok = deepcopy(ctx.obj.state)
-        temp_state_failed = deepcopy(ctx.obj.state)
+        temp_state_ok, temp_state_failed = get_working_states(fabric, bool(delete_target[fabric][ObjectKind.VPC]))
+        vpc_value = ObjectKind.VPC.value
+        # Get nodes by VPC they belong to
+        vpc_nodes = defaultdict(lambda: [[], [], []])
+        if delete_target[fabric][ObjectKind.VPC] and temp_state_failed.check_fabric(fabric):
+            for index, obj_kind in enumerate(NODE_OBJECT_KINDS):
+                for obj_name, obj in temp_state_failed.get_fabric_objects(obj_kind.value, fabric).items():
+                    vpc_nodes[obj[vpc_value]][index].append(obj_name)
         # For all vpc in delete target
         vpc_list = delete_target[fabric][ObjectKind.VPC][:]
         for vpc in vpc_list:
@@ -210,20 +221,18 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                 continue
             log_warn('VPC {0!r} is going to be deleted with all nested objects'.format(vpc))
             # Set deleting status in state
-            obj = temp_state_failed.get_fabric_object(ObjectKind.VPC.value, vpc, fabric)
+            obj = temp_state_failed.get_fabric_object(vpc_value, vpc, fabric)
             temp_state_failed.set_object_state_status(obj, ObjectState.DELETING, ObjectStatus.FAILED)
             # Get nested objects
-            nested[vpc] = []
-            for obj_kind in [ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD]:
-                nested[vpc].append([obj[0] for obj in
-                                    temp_state_failed.get_fabric_objects(obj_kind.value, fabric).items()
-                                    if vpc in obj[1][ObjectKind.VPC.value]])
+            nested[vpc] = vpc_nodes[vpc]
             # Set nested state to deleting
-            for index, obj_kind in enumerate([ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD]):
+            for index, obj_kind in enumerate(NODE_OBJECT_KINDS):
+                kind_value = obj_kind.value
+                kind_objects = temp_state_failed.get_fabric_objects(kind_value, fabric)
                 for obj_name in nested[vpc][index]:
-                    obj = temp_state_failed.get_fabric_object(obj_kind.value, obj_name, fabric)
-                    temp_state_failed.set_object_state_status(obj, ObjectState.DELETING, ObjectStatus.FAILED)
-                    res = temp_state_ok.delete_fabric_object(obj_kind.value, obj_name, fabric)
+                    temp_state_failed.set_object_state_status(kind_objects[obj_name], ObjectState.DELETING,
+                                                              ObjectStatus.FAILED)
+                    res = temp_state_ok.delete_fabric_object(kind_value, obj_name, fabric)
                     if not res.status:
                         log_error('Nested object {0!r} cannot be deleted. {1!s}'.format(obj_name, res.value))
                         sys.exit(1)
@@ -234,26 +243,10 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                 delete_nodes = True
         if delete_nodes:
             log_info("Deleting nested nodes first")
-            # Get credentials
-            credentials = Credentials(fabric, temp_state_failed.get(), ctx.obj.state.config)
-            if not credentials.get():
-                log_error('Batch failed. Not able to get credentials')
-                sys.exit(1)
             # Run terraform
-            terraform = Terraform(fabric, temp_state_ok, credentials, ctx.obj.version)
-            if not terraform.plan_generate():
-                log_error('Batch failed to delete nodes, that nested to VPCs: {!r}. Exiting'.
-                          format(delete_target[fabric][ObjectKind.VPC]))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(1)
-            terraform_result = terraform.plan_execute()
-            if not terraform_result[0]:
-                log_error('Batch failed to delete nodes, that nested to VPCs: {!r}. Exiting'.
-                          format(delete_target[fabric][ObjectKind.VPC]))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(terraform_result[1])
+            run_terraform(fabric, temp_state_ok, temp_state_failed,
+                          'Batch failed to delete nodes, that nested to VPCs: {!r}. Exiting'.format(
+                              delete_target[fabric][ObjectKind.VPC]))
         # Delete VPC from state
         for vpc in delete_target[fabric][ObjectKind.VPC]:
             res = temp_state_ok.delete_fabric_object(ObjectKind.VPC.value, vpc, fabric)
@@ -263,36 +256,23 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
         # Actual VPC delete
         if delete_target[fabric][ObjectKind.VPC]:
             log_info("Deleting VPCs")
-            # Get credentials
-            credentials = Credentials(fabric, temp_state_failed.get(), ctx.obj.state.config)
-            if not credentials.get():
-                log_error('Batch failed. Not able to get credentials')
-                sys.exit(1)
             # Run terraform
-            terraform = Terraform(fabric, temp_state_ok, credentials, ctx.obj.version)
-            if not terraform.plan_generate():
-                log_error('Batch failed to delete VPCs: {!r}. Exiting'.format(delete_target[fabric][ObjectKind.VPC]))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(1)
-            terraform_result = terraform.plan_execute()
-            if not terraform_result[0]:
-                log_error('Batch failed to delete VPCs: {!r}. Exiting'.format(delete_target[fabric][ObjectKind.VPC]))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(terraform_result[1])
+            run_terraform(fabric, temp_state_ok, temp_state_failed,
+                          'Batch failed to delete VPCs: {!r}. Exiting'.format(delete_target[fabric][ObjectKind.VPC]))
         # Delete VPCs batches
-        for vpc in delete_target[fabric][ObjectKind.VPC]:
-            temp_state_ok.nodebatch_delete(vpc=vpc)
+        if delete_target[fabric][ObjectKind.VPC]:
+            temp_state_ok.nodebatch_delete(vpcs=delete_target[fabric][ObjectKind.VPC])
         # Success
-        ctx.obj.state = deepcopy(temp_state_ok)
-        ctx.obj.state.dump()
+        if temp_state_ok is not ctx.obj.state:
+            ctx.obj.state = temp_state_ok
+            ctx.obj.state.dump()
         # Processing nodes
-        temp_state_ok = deepcopy(ctx.obj.state)
-        temp_state_failed = deepcopy(ctx.obj.state)
+        temp_state_ok, temp_state_failed = get_working_states(
+            fabric, any(delete_target[fabric][obj_kind] for obj_kind in NODE_OBJECT_KINDS))
         node_list = {}
         # For all nodes in delete target
-        for obj_kind in [ObjectKind.ORCHESTRATOR, ObjectKind.PROCESSOR, ObjectKind.WORKLOAD]:
+        for obj_kind in NODE_OBJECT_KINDS:
+            kind_value = obj_kind.value
             node_list[obj_kind] = delete_target[fabric][obj_kind][:]
             for node in node_list[obj_kind]:
                 # Check if objects are exist
@@ -313,51 +293,40 @@ def delete_batch(ctx, filename, input_format, dry_run, yes):
                             delete_target[fabric][obj_kind].remove(node)
                             continue
                 # Set deleting status in state
-                obj = temp_state_failed.get_fabric_object(obj_kind.value, node, fabric)
+                obj = temp_state_failed.get_fabric_object(kind_value, node, fabric)
                 temp_state_failed.set_object_state_status(obj, ObjectState.DELETING, ObjectStatus.FAILED)
                 # Delete node from state
-                res = temp_state_ok.delete_fabric_object(obj_kind.value, node, fabric)
+                res = temp_state_ok.delete_fabric_object(kind_value, node, fabric)
                 if not res.status:
                     log_error('Node {0!r} cannot be deleted. {1!s}'.format(node, res.value))
                     sys.exit(1)
+        # Get processors and workloads left by VPC
+        vpc_nodes = defaultdict(lambda: {ObjectKind.PROCESSOR: [], ObjectKind.WORKLOAD: []})
+        if delete_target[fabric][ObjectKind.PROCESSOR]:
+            for obj_kind in (ObjectKind.PROCESSOR, ObjectKind.WORKLOAD):
+                for obj_name, obj in temp_state_ok.get_fabric_objects(obj_kind.value, fabric).items():
+                    vpc_nodes[obj['vpc']][obj_kind].append(obj_name)
         # Check if there is at least one processor left in VPC where workloads are present
-        for proc in delete_target[fabric][ObjectKind.PROCESSOR][:]:
+        for proc in delete_target[fabric][ObjectKind.PROCESSOR]:
             # Check if its the only processor in VPC and there are workloads
             proc_vpc = temp_state_failed.get_fabric_object(ObjectKind.PROCESSOR.value, proc, fabric).get('vpc')
-            processors = [x[0] for x in temp_state_ok.get_fabric_object(ObjectKind.PROCESSOR.value, fabric).items() if
-                          proc_vpc == x[1]['vpc']]
-            workloads = [x[0] for x in temp_state_ok.get_fabric_object(ObjectKind.WORKLOAD.value, fabric).items() if
-                         proc_vpc == x[1]['vpc']]
+            processors = vpc_nodes[proc_vpc][ObjectKind.PROCESSOR]
+            workloads = vpc_nodes[proc_vpc][ObjectKind.WORKLOAD]
             if not bool(processors) and bool(workloads):
                 log_error("Cannot delete {0!r}. At least one {1} should left in VPC {2!r} to manage workloads: {3}"
                           .format(proc, ObjectKind.PROCESSOR.value.title(), proc_vpc, workloads))
                 sys.exit(1)
         # Actual node delete
-        if delete_target[fabric][ObjectKind.ORCHESTRATOR] or delete_target[fabric][ObjectKind.PROCESSOR] or \
-                delete_target[fabric][ObjectKind.WORKLOAD]:
-            # Get credentials
-            credentials = Credentials(fabric, temp_state_failed.get(), ctx.obj.state.config)
-            if not credentials.get():
-                log_error('Batch failed. Not able to get credentials')
-                sys.exit(1)
+        delete_nodes = delete_target[fabric][ObjectKind.ORCHESTRATOR] + delete_target[fabric][ObjectKind.PROCESSOR] + \
+            delete_target[fabric][ObjectKind.WORKLOAD]
+        if delete_nodes:
             # Run terraform
-            terraform = Terraform(fabric, temp_state_ok, credentials, ctx.obj.version)
-            if not terraform.plan_generate():
-                delete_nodes = delete_target[fabric][ObjectKind.ORCHESTRATOR] + \
-                               delete_target[fabric][ObjectKind.PROCESSOR] + delete_target[fabric][ObjectKind.WORKLOAD]
-                log_error('Batch failed to delete nodes: {!r}. Exiting'.format(delete_nodes))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(1)
-            terraform_result = terraform.plan_execute()
-            if not terraform_result[0]:
-                log_error('Batch failed to delete nodes: {!r}. Exiting'.format(delete_nodes))
-                ctx.obj.state = deepcopy(temp_state_failed)
-                ctx.obj.state.dump()
-                sys.exit(terraform_result[1])
+            run_terraform(fabric, temp_state_ok, temp_state_failed,
+                          'Batch failed to delete nodes: {!r}. Exiting'.format(delete_nodes))
         # Success
-        ctx.obj.state = deepcopy(temp_state_ok)
-        ctx.obj.state.dump()
+        if temp_state_ok is not ctx.obj.state:
+            ctx.obj.state = temp_state_ok
+            ctx.obj.state.dump()
     log_ok('Batch is finished')
     # Generate SSH configuration
     ssh_config = SshConfig(ctx.obj.state)
@@ -496,7 +465,7 @@ def delete_orchestrator(ctx, orchestrator_name, dry_run):
         log_error('Cannot delete {0}. There is issue with terraform plan execution'.format(obj_kind))
         sys.exit(terraform_result[1])
     # Set new state to be current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     log_ok('{0} {1!r} deleted successfully'.format(obj_kind.title(), obj_name))
     # Generate SSH configuration
@@ -563,7 +532,7 @@ def delete_processor(ctx, processor_name, dry_run):
         log_error('Cannot delete {0}. There is issue with terraform plan execution'.format(obj_kind))
         sys.exit(terraform_result[1])
     # Set new state to be current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     log_ok('{0} {1!r} deleted successfully'.format(obj_kind.title(), obj_name))
     # Generate SSH configuration
@@ -620,7 +589,7 @@ def delete_workload(ctx, workload_name, dry_run):
         log_error('Cannot delete {0}. There is issue with terraform plan execution'.format(obj_kind))
         sys.exit(terraform_result[1])
     # Set new state to be current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     log_ok('{0} {1!r} deleted successfully'.format(obj_kind.title(), obj_name))
     # Generate SSH configuration
@@ -690,7 +659,7 @@ def delete_vpc(ctx, vpc_name, dry_run):
     # Delete VPCs batches
     temp_state.nodebatch_delete(vpc=obj_name)
     # Set new state to be current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     log_ok('{0} {1!r} deleted successfully'.format(obj_kind.upper(), obj_name))
     return True
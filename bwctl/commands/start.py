@@ -70,7 +70,7 @@ def start_workload(ctx, workload_name, dry_run, all_nodes):
     temp_state = deepcopy(ctx.obj.state)
     res = temp_state.workload_start(temp_state.get_current_fabric(), obj_list)
     # Set temp state to current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     if not res[0]:
         sys.exit(res[1])
@@ -133,7 +133,7 @@ def start_processor(ctx, processor_name, dry_run, all_nodes):
     temp_state = deepcopy(ctx.obj.state)
     res = temp_state.processor_start(temp_state.get_current_fabric(), obj_list)
     # Set temp state to current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     if not res[0]:
         sys.exit(res[1])
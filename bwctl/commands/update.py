@@ -77,28 +77,28 @@ def update_workload(ctx, workload_name, dry_run, all_nodes):
     if actions_list['update']:
         ansible_playbook = "update-workload.yml"
         res = temp_state.obj_update(ansible_playbook, obj_kind, actions_list['update'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['config']:
         res = temp_state.workload_configure(temp_state.get_current_fabric(), actions_list['config'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['stop']:
         res = temp_state.workload_stop(temp_state.get_current_fabric(), actions_list['stop'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['start']:
         res = temp_state.workload_start(temp_state.get_current_fabric(), actions_list['start'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
@@ -168,28 +168,28 @@ def update_processor(ctx, processor_name, dry_run, all_nodes):
     if actions_list['update']:
         ansible_playbook = "update-processor.yml"
         res = temp_state.obj_update(ansible_playbook, obj_kind, actions_list['update'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['config']:
         res = temp_state.processor_configure(temp_state.get_current_fabric(), actions_list['config'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['stop']:
         res = temp_state.processor_stop(temp_state.get_current_fabric(), actions_list['stop'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
     temp_state = deepcopy(ctx.obj.state)
     if actions_list['start']:
         res = temp_state.processor_start(temp_state.get_current_fabric(), actions_list['start'])
-        ctx.obj.state = deepcopy(temp_state)
+        ctx.obj.state = temp_state
         ctx.obj.state.dump()
         if not res[0]:
             sys.exit(res[1])
@@ -261,7 +261,7 @@ def update_orchestrator(ctx, orchestrator_name, dry_run, all_nodes):
     ansible_playbook = "update-orchestrator.yml"
     res = temp_state.obj_update(ansible_playbook, obj_kind, obj_list)
     # Set temp state to current and dump it
-    ctx.obj.state = deepcopy(temp_state)
+    ctx.obj.state = temp_state
     ctx.obj.state.dump()
     if not res[0]:
         sys.exit(res[1])
@@ -27,11 +27,7 @@ class Config:
         self.file: str = os.path.join(self.dir, 'config')
 
         # Ensure configuration directory exists
-        try:
-            os.makedirs(self.dir)
-        except FileExistsError:
-            # directory already exists
-            pass
+        os.makedirs(self.dir, exist_ok=True)
 
         # Initialise configuration
         self.config: Dict = {}
@@ -63,6 +59,10 @@ class Config:
             self.config
         )
 
+    def get_batch_max_size(self) -> int:
+        """Get application configuration batch file size limit"""
+        return self.get_attr('batch_max_size')
+
     def get_branch(self) -> str:
         """Get application configuration branch"""
         return self.get_attr('components.branch')
@@ -83,6 +83,7 @@ class Config:
         """Init configuration state"""
         if not self.init_attr_fabric_manager():
             return False
+        self.init_attr_batch_max_size()
         self.init_attr_components()
         self.init_attr_credentials()
         self.init_attr_current_fabric()
@@ -119,6 +120,13 @@ class Config:
         self.set_attr('fabric_manager', fabric_manager, override=True)
         return True
 
+    def init_attr_batch_max_size(self) -> bool:
+        """Init configuration attribute batch_max_size"""
+        # Set default value
+        if not bool(self.get_attr('batch_max_size')):
+            self.set_attr('batch_max_size', 3 * 1024 * 1024, override=False)
+        return True
+
     def init_attr_components(self) -> bool:
         """Init configuration attribute components"""
         # Set default values
@@ -56,11 +56,7 @@ class Session:
         self.terraform_dir: str = os.path.join(self.state.config.dir, 'terraform')
 
         # Ensure terraform plan structures ready
-        try:
-            os.makedirs(self.terraform_dir)
-        except FileExistsError:
-            # directory already exists
-            pass
+        os.makedirs(self.terraform_dir, exist_ok=True)
         for entity in ['modules', 'resources']:
             src: str = os.path.join(os.path.dirname(bwctl_resources.terraform.__file__), entity)
             dst: str = os.path.join(self.terraform_dir, entity)
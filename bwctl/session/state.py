@@ -39,6 +39,8 @@ class State:
         self.ansible_dir: str = os.path.dirname(bwctl_resources.ansible.__file__)
         self.state_file: str = ''
         self.state: Dict = {}
+        # State is changed but not dumped yet
+        self.dirty: bool = False
 
         # Initialise supported object states
         self.object_state = ObjectState
@@ -151,6 +153,19 @@ class State:
         else:
             return dump_dict_to_file(self.state_file, self.state)
 
+    def flush(self) -> bool:
+        """Dump state if it was changed since last flush"""
+        if not self.dirty:
+            return True
+        if not self.dump():
+            return False
+        self.dirty = False
+        return True
+
+    def mark_dirty(self):
+        """Mark state as changed, so it is dumped by next flush"""
+        self.dirty = True
+
     def get_current_fabric(self) -> Any:
         """Get current fabric name"""
         current_fabric: str = self.config.get_current_fabric()
@@ -308,7 +323,7 @@ class State:
                                                                          for elem in state_list)
 
         if type(state) == ObjectState:
-            return self.get_object_state(obj) == state
+            return self.get_object_attr(obj, 'state') == state.value
         elif check_list_object_state(state):
             return self.get_object_state(obj) in state
         else:
@@ -316,11 +331,12 @@ class State:
 
     def check_object_state_status(self, obj: Dict, state: ObjectState, status: ObjectStatus) -> bool:
         """Return True if Obj current state/status is given state/status"""
-        return self.get_object_state(obj) == state and self.get_object_status(obj) == status
+        return self.get_object_attr(obj, 'state') == state.value and \
+            self.get_object_attr(obj, 'status') == status.value
 
     def check_object_status(self, obj: Dict, status: ObjectStatus) -> bool:
         """Return True if Obj current status is given status"""
-        return self.get_object_status(obj) == status
+        return self.get_object_attr(obj, 'status') == status.value
 
     def set_object_state_status(self, obj: Dict, state: ObjectState, status: ObjectStatus):
         """Set Object state and status tuple"""
@@ -343,6 +359,15 @@ class State:
             return False
         return True
 
+    @staticmethod
+    def get_object_attr(obj: Dict, attr: str) -> Any:
+        """Returns raw state/status value of given obj, without converting it to enum"""
+        try:
+            return obj[attr]
+        except TypeError:
+            log_error("No {} in Obj".format(attr))
+            return False
+
     @staticmethod
     def get_object_state(obj: Dict) -> Any:
         """Returns state of given obj"""
@@ -381,6 +406,20 @@ class State:
         except ValueError:
             return None
 
+    @staticmethod
+    def classify_object(obj: Dict) -> str:
+        """Returns 'created_ok', 'created_failed', 'deleting' or 'other' class of given obj"""
+        obj_state = obj.get('state')
+        if obj_state == ObjectState.CREATED.value:
+            obj_status = obj.get('status')
+            if obj_status == ObjectStatus.SUCCESS.value:
+                return 'created_ok'
+            if obj_status == ObjectStatus.FAILED.value:
+                return 'created_failed'
+        elif obj_state == ObjectState.DELETING.value:
+            return 'deleting'
+        return 'other'
+
     def add_batch(self, batch_name: str, batch: Dict):
         """Adds batch obj to the state"""
         self.state['batch'][batch_name] = batch
@@ -1209,41 +1248,35 @@ class State:
                 res: Result = self.delete_nodebatch(nodebatch)
                 if not res.status:
                     return False
+                self.mark_dirty()
                 nodebatch_targets.remove(nodebatch)
         return True
 
-    def nodebatch_delete(self, fabric: Any = None, vpc: Any = None) -> bool:
-        """Deletes node batches for fabric or vpc"""
+    def nodebatch_delete(self, fabric: Any = None, vpc: Any = None, vpcs: List = None) -> bool:
+        """Deletes node batches for fabric, vpc or list of vpcs"""
         nodebatches: List = []
-        workloads: List = []
-        processors: List = []
-        entity: str = ""
-        entity_type: str = ""
-        for batch in self.state['batch']:
-            if vpc is not None:
-                if ObjectKind.WORKLOAD.value in self.state['batch'][batch]:
-                    workloads = [item[1] for item in self.state['batch'][batch][ObjectKind.WORKLOAD.value].items() if
-                                 item[1]['spec']['vpc'] == vpc]
-                if ObjectKind.PROCESSOR.value in self.state['batch'][batch]:
-                    processors = [item[1] for item in self.state['batch'][batch][ObjectKind.PROCESSOR.value].items() if
-                                  item[1]['spec']['vpc'] == vpc]
-                nodes: List = workloads + processors
-                entity_type = 'VPC'
-                entity = vpc
-            elif fabric is not None:
-                if ObjectKind.WORKLOAD.value in self.state['batch'][batch]:
-                    workloads = [item[1] for item in self.state['batch'][batch][ObjectKind.WORKLOAD.value].items() if
-                                 item[1]['metadata']['fabric'] == fabric]
-                if ObjectKind.PROCESSOR.value in self.state['batch'][batch]:
-                    processors = [item[1] for item in self.state['batch'][batch][ObjectKind.PROCESSOR.value].items() if
-                                  item[1]['metadata']['fabric'] == fabric]
-                nodes = workloads + processors
-                entity_type = 'fabric'
-                entity = fabric
-            else:
-                return False
-            if bool(nodes):
-                nodebatches.append(batch)
+        if vpc is not None:
+            vpcs = [vpc]
+        if vpcs is not None:
+            vpc_names: set = set(vpcs)
+            entity_type: str = 'VPC'
+            entity: Any = vpc if vpc is not None else vpcs
+        elif fabric is not None:
+            vpc_names = None
+            entity_type = 'fabric'
+            entity = fabric
+        else:
+            return False
+        for batch, batch_obj in self.state['batch'].items():
+            for node_kind in [ObjectKind.WORKLOAD.value, ObjectKind.PROCESSOR.value]:
+                nodes = batch_obj.get(node_kind, {}).values()
+                if vpc_names is not None:
+                    found = any(node['spec']['vpc'] in vpc_names for node in nodes)
+                else:
+                    found = any(node['metadata']['fabric'] == fabric for node in nodes)
+                if found:
+                    nodebatches.append(batch)
+                    break
         if bool(nodebatches):
             log_warn("Active node batches found: {!r} in {} {!r}, going to be deleted"
                      .format(nodebatches, entity_type, entity))
@@ -1299,16 +1332,39 @@ class State:
         self.state['fabric'][fabric]['config']['credentialsFile'] = path
         return True
 
-    def get_processor_spec_from_batch(self, entity: List) -> Dict:
+    def get_processor_spec_from_batch(self, entity: Dict) -> Dict:
         """Returns processor config from batch"""
         new_processor: Dict = self.get_clean_processor()
-        for config_param in entity[0]['spec']['config']:
-            new_processor['config'][config_param] = entity[0]['spec']['config'][config_param]
+        for config_param in entity['spec']['config']:
+            new_processor['config'][config_param] = entity['spec']['config'][config_param]
         return new_processor['config']
 
-    def get_workload_spec_from_batch(self, entity: List) -> Dict:
+    def get_workload_spec_from_batch(self, entity: Dict) -> Dict:
         """Returns workload config from batch"""
         new_workload: Dict = self.get_clean_workload()
-        for config_param in entity[0]['spec']['config']:
-            new_workload['config'][config_param] = entity[0]['spec']['config'][config_param]
+        for config_param in entity['spec']['config']:
+            new_workload['config'][config_param] = entity['spec']['config'][config_param]
         return new_workload['config']
+
+
+class CowState(State):
+    """Working copy of state which copies only the fabric (or fabric objects) to be modified"""
+
+    def __init__(self, base: State, fabric_name: str = None, obj_kind: str = None):
+        """Initialise all attributes from base state, sharing everything except given fabric (or its obj_kind)"""
+        # pylint: disable=super-init-not-called
+        self.__dict__.update(base.__dict__)
+        if fabric_name is None:
+            fabric_name = base.get_current_fabric()
+        # Top level containers are copied, so objects can be added/deleted without touching base state
+        self.state = dict(base.state)
+        self.state['fabric'] = dict(base.state['fabric'])
+        # Node batches in progress are kept small and may be changed by any fabric action
+        self.state['batch'] = deepcopy(base.state.get('batch', {}))
+        if fabric_name in self.state['fabric']:
+            if obj_kind is None:
+                self.state['fabric'][fabric_name] = deepcopy(self.state['fabric'][fabric_name])
+            else:
+                fabric: Dict = dict(self.state['fabric'][fabric_name])
+                fabric[obj_kind] = deepcopy(fabric.get(obj_kind, {}))
+                self.state['fabric'][fabric_name] = fabric
@@ -1,10 +1,8 @@
-import getpass
 import sys
 from datetime import datetime
 
 import boto3
 import click
-import psutil
 import yaml
 
 
@@ -38,6 +36,16 @@ def log_warn(msg, nl=True):
     log_color(msg, nl=nl, fg='yellow')
 
 
+def log_cmd_error(err):
+    """Echo failed sh command and its captured output line by line"""
+    log_info(err.full_cmd)
+    log_info('Command output:')
+    for line in err.stdout.splitlines():
+        log_info(line.decode('UTF-8', 'replace'))
+    for line in err.stderr.splitlines():
+        log_error(line.decode('UTF-8', 'replace'))
+
+
 def dump_dict_to_file(out_file, data):
     """Dump dict to a file"""
     # noinspection PyBroadException
@@ -81,16 +89,3 @@ def dump_to_file(out_file, data):
         log_error("{0} - Unexpected error: {1} ({2})".format(out_file, sys.exc_info()[0], err))
         return False
     return True
-
-
-def check_process_running(process_name):
-    """Check if there is any running process with the given name"""
-    current_user = getpass.getuser()
-    for proc in psutil.process_iter():
-        try:
-            pinfo = proc.as_dict(attrs=['pid', 'name', 'username'])
-            if process_name == pinfo['name'] and current_user == pinfo['username']:
-                return True, pinfo['pid'], pinfo['username']
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return False, None, None
@@ -0,0 +1,62 @@
+import glob
+import hashlib
+import os
+import pickle
+
+import yaml
+
+try:
+    # libyaml based loader, available if PyYAML is built with libyaml (libyaml-dev)
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Bump when the cached representation changes, so stale entries are ignored
+CACHE_FORMAT_VERSION = 1
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+
+def safe_load(stream):
+    """Parse YAML stream with the fastest available safe loader"""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_load_cached(content, cache_dir: str):
+    """Parse YAML content (bytes or mmap), reusing previously parsed result for the same content from cache directory"""
+    key = hashlib.blake2b(content, digest_size=16)
+    key.update('{}:{}'.format(CACHE_FORMAT_VERSION, yaml.__version__).encode('UTF-8'))
+    cache_file = os.path.join(cache_dir, key.hexdigest() + '.pkl')
+    # noinspection PyBroadException
+    try:
+        with open(cache_file, 'rb') as cache_f:
+            return pickle.load(cache_f)
+    except Exception:
+        pass
+    data = safe_load(content)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as cache_f:
+            pickle.dump(data, cache_f, protocol=pickle.HIGHEST_PROTOCOL)
+        evict_cache(cache_dir)
+    except (OSError, pickle.PicklingError):
+        pass
+    return data
+
+
+def evict_cache(cache_dir: str, max_size: int = CACHE_MAX_SIZE):
+    """Remove least recently written cache entries above max size"""
+    entries = []
+    for cache_file in glob.glob(os.path.join(cache_dir, '*.pkl')):
+        try:
+            entries.append((os.path.getmtime(cache_file), os.path.getsize(cache_file), cache_file))
+        except OSError:
+            continue
+    total_size = sum(entry[1] for entry in entries)
+    for _, size, cache_file in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        total_size -= size
@@ -22,7 +22,6 @@ requires = [
     'click-repl==0.1.6',
     'jinja2==2.10.1',
     'pid==2.2.5',
-    'psutil==5.6.3',
     'pyyaml==5.1',
     'requests==2.21.0',
     'sh==1.12.14'
@@ -39,6 +38,7 @@ setup(
     url='https://www.bayware.io',
     platforms='Posix;',
     install_requires=requires,
+    extras_require={'speedups': ['orjson']},
     packages=['bwctl', 'bwctl.actions', 'bwctl.commands', 'bwctl.session', 'bwctl.utils', 'bwctl.templates'],
     package_data={'bwctl': ['version_family.txt', 'version.txt'], 'bwctl.templates': ['*', '*/*']},
     entry_points='''